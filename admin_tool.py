@@ -6,30 +6,134 @@ Run this in a separate terminal after starting index.js:
   python3 admin_tool.py
 
 Features:
-- Loads /workspaces/codespaces-blank/data.json and autosaves every 1s when dirty.
+- Loads /workspaces/codespaces-blank/data.json and journals edits to data.journal every 1s when dirty.
+- Compacts the journal into a full data.json snapshot every 60s and on "Save now".
 - Creates timestamped backups before destructive changes.
-- Temporarily disables a "shield" flag in data.meta so other processes can detect admin override.
+- Writes meta.shield.json during destructive changes so other processes can detect admin override.
 - Thread-safe operations and atomic file writes.
 """
+import functools
+import io
 import json
+import multiprocessing
 import os
+import signal
+import string
+import sys
 import time
-import shutil
 import threading
-import re
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # large files are then read in one go
+    ijson = None
+if ijson is not None and getattr(ijson, 'backend', '') not in ('yajl2_c', 'yajl2_cffi'):
+    # the pure-Python backend parses many times slower than one read + _loads
+    ijson = None
+
+try:
+    import zstandard as zstd
+except ImportError:  # backups are then written uncompressed
+    zstd = None
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), 'data.json')
+JOURNAL_PATH = os.path.join(os.path.dirname(__file__), 'data.journal')
+ROTATED_JOURNAL_PATH = JOURNAL_PATH + '.1'  # being folded into data.json by the compactor
+SHIELD_PATH = os.path.join(os.path.dirname(__file__), 'meta.shield.json')
 BACKUP_DIR = os.path.join(os.path.dirname(__file__), 'backups')
 AUTOSAVE_INTERVAL = 1.0  # seconds
+SNAPSHOT_INTERVAL = 60.0  # seconds
+STREAM_LOAD_MIN_BYTES = 16 * 1024 * 1024  # stream-parse data.json above this size
+
+# Input validation
+_USERNAME_CHARS = frozenset(string.ascii_letters + string.digits + '_-.')
 
 # State
-data_lock = threading.RLock()
+data_lock = threading.Lock()  # not re-entrant: helpers marked "data_lock held" never take it
 _dirty = False
 _data = {}
 _stop_event = threading.Event()
+_journal_fh = None  # O_APPEND fd for data.journal
+_journal_buf = []  # encoded records not yet written to the journal
+_journal_size = 0  # bytes in the journal since the last snapshot
+_journal_gen = 0  # bumped by every compaction; stale batches are dropped
+_journal_retry = []  # records from a failed write, written ahead of anything newer (_journal_lock)
+# Serializes journal writes and truncation. Always taken after data_lock, never
+# before, so journal I/O can run without holding data_lock.
+_journal_lock = threading.Lock()
+_last_snapshot = time.monotonic()
+# Periodic snapshots run in a spawned child so encoding and fsync stay out of
+# this process. _compact_lock keeps them from overlapping an in-process
+# compaction; take it before data_lock, never while holding it.
+_compactor = None
+_compact_lock = threading.Lock()
+
+# Lookup indexes over _data, rebuilt on load and kept in step with every
+# mutation under data_lock. Values are the same dicts that live in _data.
+_users_by_name = {}
+_users_by_contact = {}
+_chat_by_id = {}
+_chats_by_user = {}  # participant -> chats
+_contacts_by_user = {}  # username -> contact requests it sent or received
+
+# fdatasync skips the metadata flush where the platform has it
+_datasync = getattr(os, 'fdatasync', os.fsync)
 
 # Helpers
+def _valid_username(s):
+    # [A-Za-z0-9_.-]{1,64}
+    return 0 < len(s) <= 64 and _USERNAME_CHARS.issuperset(s)
+
+def _valid_contact(s):
+    # C- followed by exactly six ASCII digits
+    return len(s) == 8 and s.isascii() and s.startswith('C-') and s[2:].isdigit()
+
+def _dumps(obj):
+    """Compact one-line UTF-8 JSON, newline terminated."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(obj, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+def _loads(buf):
+    if orjson is not None:
+        return orjson.loads(buf)
+    return json.loads(buf)
+
+def _read_snapshot(f):
+    # Streaming builds the same dict one top-level key at a time, so the raw
+    # file is never held in memory next to the parsed objects. Every field is
+    # still materialized: snapshots write the whole store back out.
+    if ijson is not None and os.fstat(f.fileno()).st_size >= STREAM_LOAD_MIN_BYTES:
+        return {k: v for k, v in ijson.kvitems(f, '', use_float=True)}
+    return _loads(f.read())
+
+def _pretty_dump(obj, path):
+    """Indented stdlib output for backups people read and diff.
+
+    Written zstd-compressed to path + '.zst' when zstandard is available
+    (`zstd -d` restores the readable file). Returns the path written.
+    """
+    if zstd is None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False)
+        return path
+    path += '.zst'
+    with open(path, 'wb') as raw:
+        with io.TextIOWrapper(zstd.ZstdCompressor(level=3).stream_writer(raw), encoding='utf-8') as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False)
+    return path
+
+def _ensure_shape(data):
+    # the only place missing top-level keys are filled in; everything else indexes directly
+    for k, default in (('users', []), ('chats', []), ('contactRequests', []), ('meta', {})):
+        data.setdefault(k, default)
+
 def load_data():
     global _data, _dirty
     if not os.path.exists(DATA_PATH):
@@ -39,15 +143,233 @@ def load_data():
             atomic_write(DATA_PATH, _data)
         except Exception as e:
             print("Warning: could not write initial data.json:", e)
-        _dirty = False
+    else:
+        try:
+            with open(DATA_PATH, 'rb') as f:
+                _data = _read_snapshot(f)
+        except Exception as e:
+            print("Failed to load data.json:", e)
+            _data = {"users": [], "chats": [], "contactRequests": [], "meta": {"lastModified": int(time.time() * 1000)}}
+    _ensure_shape(_data)
+    _dirty = False
+    # any leftover bytes, even a torn line with no complete record, must be
+    # cleared before appending again or the next record is glued onto them
+    leftover = any(os.path.exists(p) and os.path.getsize(p) for p in (ROTATED_JOURNAL_PATH, JOURNAL_PATH))
+    replayed = replay_journal(ROTATED_JOURNAL_PATH) + replay_journal(JOURNAL_PATH)
+    open_journal()
+    if replayed:
+        print(f"Replayed {replayed} journal record(s).")
+    if leftover:
+        # fold edits left over from an unclean exit into the snapshot
+        compact_data()
+    rebuild_indexes()
+
+# Indexes
+def _index_chat(c):
+    _chat_by_id[c.get('id')] = c
+    for p in c.get('participants', []):
+        _chats_by_user.setdefault(p, []).append(c)
+
+def _unindex_chat(c):
+    _chat_by_id.pop(c.get('id'), None)
+    for p in c.get('participants', []):
+        chats = _chats_by_user.get(p)
+        if chats and c in chats:
+            chats.remove(c)
+
+def _index_request(r):
+    for name in {r.get('from'), r.get('to')}:
+        _contacts_by_user.setdefault(name, []).append(r)
+
+def _unindex_request(r):
+    for name in {r.get('from'), r.get('to')}:
+        reqs = _contacts_by_user.get(name)
+        if reqs and r in reqs:
+            reqs.remove(r)
+
+def _remove_items(lst, items):
+    # one in-place pass by identity, instead of a list.remove() scan per item
+    if not items:
         return
-    try:
-        with open(DATA_PATH, 'r', encoding='utf-8') as f:
-            _data = json.load(f)
-    except Exception as e:
-        print("Failed to load data.json:", e)
-        _data = {"users": [], "chats": [], "contactRequests": [], "meta": {"lastModified": int(time.time() * 1000)}}
+    gone = {id(x) for x in items}
+    lst[:] = [x for x in lst if id(x) not in gone]
+
+def _intern(v):
+    return sys.intern(v) if type(v) is str else v
+
+def rebuild_indexes():
+    """Rebuild every index from _data.
+
+    Usernames are repeated in every participant list, message and contact
+    request; the parser hands back a fresh string for each, so they are
+    interned here to keep a single copy per name.
+    """
+    with data_lock:
+        for index in (_users_by_name, _users_by_contact, _chat_by_id, _chats_by_user, _contacts_by_user):
+            index.clear()
+        for u in _data['users']:
+            if 'username' in u:
+                u['username'] = _intern(u['username'])
+            _users_by_name[u.get('username')] = u
+            _users_by_contact[u.get('contactNumber')] = u
+        for c in _data['chats']:
+            if isinstance(c.get('participants'), list):
+                c['participants'] = [_intern(p) for p in c['participants']]
+            for m in c.get('messages', []):
+                if 'sender' in m:
+                    m['sender'] = _intern(m['sender'])
+            _index_chat(c)
+        for r in _data['contactRequests']:
+            for k in ('from', 'to'):
+                if k in r:
+                    r[k] = _intern(r[k])
+            _index_request(r)
+
+# Journal: one JSON line per mutation, e.g.
+#   {"op":"set","path":["users","user-1","username"],"value":"bob"}
+#   {"op":"del","path":["chats","inbox-bob"]}
+# Path steps into a list are matched against the item's "id", so records are
+# position independent and replaying them on an already-compacted snapshot is harmless.
+# meta.lastModified is never journaled: whoever writes the snapshot stamps it.
+def _journal_child(node, key, index):
+    if isinstance(node, list):
+        return _journal_lookup(node, index).get(key)
+    if isinstance(node, dict):
+        return node.get(key)
+    return None
+
+def _journal_lookup(items, index):
+    # id -> item for one list, built on first use and kept in step by
+    # _journal_apply, so a replay costs one pass per list instead of one per record
+    entry = index.get(id(items))
+    if entry is None or entry[0] is not items:
+        by_id = {}
+        for x in items:
+            if isinstance(x, dict):
+                by_id.setdefault(x.get('id'), x)
+        entry = index[id(items)] = (items, by_id)
+    return entry[1]
+
+def _journal_apply(rec, index):
+    path = rec.get('path') or []
+    if not path:
+        return
+    owner = None
+    parent = _data
+    for key in path[:-1]:
+        owner = parent
+        parent = _journal_child(parent, key, index)
+        if parent is None:
+            return
+    key = path[-1]
+    op = rec.get('op')
+    if isinstance(parent, list):
+        by_id = _journal_lookup(parent, index)
+        old = by_id.get(key)
+        if op == 'set':
+            value = rec.get('value')
+            if old is None:
+                parent.append(value)
+            else:
+                parent[next(i for i, x in enumerate(parent) if x is old)] = value
+            by_id[key] = value
+        elif op == 'del' and old is not None:
+            del parent[next(i for i, x in enumerate(parent) if x is old)]
+            del by_id[key]
+    elif isinstance(parent, dict):
+        old_id = parent.get('id')
+        if op == 'set':
+            parent[key] = rec.get('value')
+        elif op == 'del':
+            parent.pop(key, None)
+        if key == 'id' and isinstance(owner, list):
+            # the item moved to a new id (e.g. a renamed inbox)
+            by_id = _journal_lookup(owner, index)
+            if by_id.get(old_id) is parent:
+                del by_id[old_id]
+            if 'id' in parent:
+                by_id.setdefault(parent['id'], parent)
+
+def replay_journal(path=JOURNAL_PATH):
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    index = {}
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                rec = _loads(line)
+            except ValueError:
+                # torn tail from a crash mid-append
+                continue
+            _journal_apply(rec, index)
+            count += 1
+    return count
+
+def open_journal():
+    global _journal_fh, _journal_size
+    if _journal_fh is None:
+        _journal_fh = os.open(JOURNAL_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    _journal_size = os.fstat(_journal_fh).st_size
+
+def close_journal():
+    global _journal_fh
+    with _journal_lock:
+        if _journal_fh is not None:
+            os.close(_journal_fh)
+            _journal_fh = None
+
+def _take_journal_batch():
+    # data_lock held
+    global _dirty
+    batch = _journal_buf[:]
+    _journal_buf.clear()
     _dirty = False
+    return batch, _journal_gen
+
+def flush_journal():
+    """Append queued records to the journal and fdatasync it.
+
+    Only the buffer swap happens under data_lock; the write and sync do not,
+    so the menu thread never waits on the disk for the autosave thread.
+    """
+    with data_lock:
+        batch, gen = _take_journal_batch()
+    _write_journal_batch(batch, gen)
+
+def _write_journal_batch(batch, gen):
+    # data_lock NOT held: the batch was taken with _take_journal_batch()
+    global _dirty, _journal_size
+    try:
+        with _journal_lock:
+            # a compaction since the swap already put these edits in data.json
+            if gen != _journal_gen or _journal_fh is None:
+                return
+            batch = _journal_retry + batch
+            if not batch:
+                return
+            chunk = b''.join(batch)
+            try:
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(_journal_fh, view):]
+                _datasync(_journal_fh)
+            except OSError:
+                # keep the records for the next flush and drop any partial
+                # tail so they start on a fresh line
+                _journal_retry[:] = batch
+                try:
+                    os.ftruncate(_journal_fh, _journal_size)
+                except OSError:
+                    pass
+                raise
+            _journal_retry.clear()
+            _journal_size += len(chunk)
+    except OSError:
+        # have the autosave loop try again
+        with data_lock:
+            _dirty = True
+        raise
 
 def atomic_write(path, obj):
     # Ensure directory exists
@@ -55,98 +377,203 @@ def atomic_write(path, obj):
     if d and not os.path.exists(d):
         os.makedirs(d, exist_ok=True)
     tmp = path + '.tmp'
-    with open(tmp, 'w', encoding='utf-8') as f:
-        json.dump(obj, f, indent=2, ensure_ascii=False)
+    with open(tmp, 'wb') as f:
+        f.write(_dumps(obj))
         f.flush()
-        os.fsync(f.fileno())
+        _datasync(f.fileno())
     os.replace(tmp, path)
+    _fsync_dir(d or '.')
 
-def save_data(force=False):
-    global _dirty
-    with data_lock:
-        if not force and not _dirty:
-            return
-        try:
+def _fsync_dir(d):
+    # make the rename itself durable; not possible on platforms without O_DIRECTORY
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    dir_fd = os.open(d, os.O_DIRECTORY | os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def compact_data():
+    """Write a full snapshot to data.json and truncate the journal."""
+    global _dirty, _journal_size, _journal_gen, _last_snapshot
+    with _compact_lock:
+        _reap_compactor(wait=True)
+        with data_lock:
             # update lastModified
-            _data.setdefault('meta', {})['lastModified'] = int(time.time() * 1000)
+            _data['meta']['lastModified'] = int(time.time() * 1000)
             atomic_write(DATA_PATH, _data)
+            _journal_buf.clear()
+            with _journal_lock:
+                if _journal_fh is not None:
+                    os.ftruncate(_journal_fh, 0)
+                if os.path.exists(ROTATED_JOURNAL_PATH):
+                    os.unlink(ROTATED_JOURNAL_PATH)
+                _journal_retry.clear()
+                _journal_size = 0
+                _journal_gen += 1
             _dirty = False
-        except Exception as e:
-            print("Error saving data.json:", e)
+            _last_snapshot = time.monotonic()
+
+def _reap_compactor(wait=False):
+    global _compactor
+    if _compactor is None:
+        return
+    if not wait and _compactor.is_alive():
+        return
+    _compactor.join()
+    if _compactor.exitcode != 0:
+        print(f"Background compaction failed (exit code {_compactor.exitcode}); will retry.")
+    _compactor = None
+
+def _compact_worker(data_path, journal_path):
+    # runs in the child: its own _data, rebuilt from disk
+    global _data
+    # Ctrl-C at the admin prompt reaches the whole process group; the parent
+    # handles it, the child just finishes its snapshot
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        with open(data_path, 'rb') as f:
+            _data = _read_snapshot(f)
+        _ensure_shape(_data)
+        replay_journal(journal_path)
+        _data['meta']['lastModified'] = int(time.time() * 1000)
+        atomic_write(data_path, _data)
+        os.unlink(journal_path)
+    except Exception:
+        # no traceback in the middle of the admin prompt; the parent reports the exit code
+        sys.exit(1)
+
+def start_compaction():
+    """Rotate the journal aside and fold it into data.json in a child process."""
+    global _compactor, _journal_fh, _journal_size, _last_snapshot
+    with _compact_lock:
+        _reap_compactor()
+        if _compactor is not None:
+            return
+        flush_journal()
+        with _journal_lock:
+            # if a rotated journal is still there the last child failed: retry it as is
+            if not os.path.exists(ROTATED_JOURNAL_PATH) and _journal_fh is not None:
+                os.close(_journal_fh)
+                os.replace(JOURNAL_PATH, ROTATED_JOURNAL_PATH)
+                _journal_fh = os.open(JOURNAL_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                _journal_size = 0
+                _fsync_dir(os.path.dirname(JOURNAL_PATH) or '.')
+        _compactor = multiprocessing.get_context('spawn').Process(
+            target=_compact_worker, args=(DATA_PATH, ROTATED_JOURNAL_PATH), daemon=True)
+        _compactor.start()
+        _last_snapshot = time.monotonic()
+
+def save_data(force=False):
+    """Append pending edits to the journal.
+
+    force snapshots in-process; otherwise a background compaction is started
+    once SNAPSHOT_INTERVAL has passed. Must not be called with data_lock held.
+    """
+    try:
+        if force:
+            compact_data()
+        elif time.monotonic() - _last_snapshot >= SNAPSHOT_INTERVAL and (
+                _journal_size or _journal_buf or os.path.exists(ROTATED_JOURNAL_PATH)):
+            # a rotated journal still on disk means the last compactor failed
+            start_compaction()
+        elif _dirty:
+            flush_journal()
+    except Exception as e:
+        print("Error saving data.json:", e)
 
 def autosave_loop():
     while not _stop_event.wait(AUTOSAVE_INTERVAL):
-        with data_lock:
-            if _dirty:
-                save_data()
+        save_data()
 
-def mark_dirty():
+def mark_dirty(op=None, path=None, value=None):
+    # data_lock held
     global _dirty
-    with data_lock:
-        _dirty = True
+    _dirty = True
+    if op is not None:
+        rec = {"op": op, "path": path}
+        if op == 'set':
+            rec["value"] = value
+        _journal_buf.append(_dumps(rec))
 
 def backup_data(note=''):
-    # ensure data exists on disk first
-    if not os.path.exists(DATA_PATH):
-        try:
-            save_data(force=True)
-        except Exception:
-            pass
+    # back up the in-memory state: data.json can lag behind the journal
     os.makedirs(BACKUP_DIR, exist_ok=True)
     ts = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
     bak_name = f"data.json.bak.{ts}"
     bak_path = os.path.join(BACKUP_DIR, bak_name)
     try:
-        shutil.copy2(DATA_PATH, bak_path)
+        with data_lock:
+            written = _pretty_dump(_data, bak_path)
         if note:
             with open(bak_path + '.note.txt', 'w', encoding='utf-8') as nf:
                 nf.write(note)
-        print(f"Backup written: {bak_path}")
+        print(f"Backup written: {written}")
     except Exception as e:
         print("Backup failed:", e)
 
-# Shield context manager: writes shield flags immediately and restores previous meta on exit
+# Shield context manager: meta.shield.json exists for the duration of the block.
+# Other processes test for the file instead of parsing data.json; the data
+# itself is left to the journal. Admin ops use it as
+#   with ShieldDisabled() as shield, data_lock:
+#       ...mutate...
+#       shield.stage()
+# so one acquisition covers the mutation and the lastModified bump, while the
+# shield file and the journal flush are written with data_lock released.
 class ShieldDisabled:
     def __init__(self, actor='admin_tool'):
         self.actor = actor
-        self._previous_meta = None
+        self._staged = None
 
     def __enter__(self):
-        with data_lock:
-            meta = _data.setdefault('meta', {})
-            # keep a shallow copy to restore non-shield keys
-            self._previous_meta = dict(meta)
-            meta['shield_disabled'] = True
-            meta['shield_disabled_by'] = self.actor
-            meta['shield_disabled_at'] = int(time.time() * 1000)
-            mark_dirty()
-            save_data(force=True)  # flush immediately so other processes see it
+        # flush immediately so other processes see it
+        try:
+            atomic_write(SHIELD_PATH, {"active": True, "actor": self.actor, "ts": int(time.time() * 1000)})
+        except OSError as e:
+            print("Error writing meta.shield.json:", e)
         return self
 
+    def stage(self):
+        # data_lock held: bump lastModified and take the journal batch for __exit__
+        _data['meta']['lastModified'] = int(time.time() * 1000)
+        mark_dirty()
+        self._staged = _take_journal_batch()
+
     def __exit__(self, exc_type, exc, tb):
-        with data_lock:
-            meta = _data.setdefault('meta', {})
-            # remove our shield keys
-            for k in ('shield_disabled', 'shield_disabled_by', 'shield_disabled_at'):
-                meta.pop(k, None)
-            # restore other previous keys (but don't overwrite new unrelated keys)
-            if isinstance(self._previous_meta, dict):
-                for k, v in self._previous_meta.items():
-                    if k not in ('shield_disabled', 'shield_disabled_by', 'shield_disabled_at'):
-                        meta[k] = v
-            meta['lastModified'] = int(time.time() * 1000)
-            mark_dirty()
-            save_data(force=True)
+        try:
+            if self._staged is None:
+                with data_lock:
+                    self.stage()
+            # the change is durable before the shield drops
+            _write_journal_batch(*self._staged)
+        except OSError as e:
+            # the edits stay queued; autosave retries the journal write
+            print("Error saving data.json:", e)
+        finally:
+            self._staged = None
+            try:
+                os.unlink(SHIELD_PATH)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print("Error removing meta.shield.json:", e)
 
 # Data utilities
+def _write_lines(lines):
+    # one write for the whole listing instead of a print per row
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
 def list_users():
     with data_lock:
-        for u in _data.get('users', []):
-            print(f"- {u.get('username')} (id={u.get('id')}, contact={u.get('contactNumber')})")
+        lines = [f"- {u.get('username')} (id={u.get('id')}, contact={u.get('contactNumber')})" for u in _data['users']]
+    _write_lines(lines)
 
 def find_user(username):
     with data_lock:
-        return next((u for u in _data.get('users', []) if u.get('username') == username), None)
+        return _users_by_name.get(username)
 
 def delete_user(username):
     u = find_user(username)
@@ -158,42 +585,56 @@ def delete_user(username):
         print("Aborted.")
         return
     backup_data(note=f"Deleting user {username}")
-    with ShieldDisabled(actor='admin_tool'):
-        with data_lock:
-            # remove user
-            before_users = len(_data.get('users', []))
-            _data['users'] = [x for x in _data.get('users', []) if x.get('username') != username]
-            removed_users = before_users - len(_data['users'])
-            # remove contact requests involving user
-            before_reqs = len(_data.get('contactRequests', []))
-            _data['contactRequests'] = [r for r in _data.get('contactRequests', []) if r.get('from') != username and r.get('to') != username]
-            removed_reqs = before_reqs - len(_data['contactRequests'])
-            # remove chats where user participates
-            before_chats = len(_data.get('chats', []))
-            removed_chats_list = [c for c in _data.get('chats', []) if username in c.get('participants', [])]
-            _data['chats'] = [c for c in _data.get('chats', []) if username not in c.get('participants', [])]
-            removed_chats = before_chats - len(_data['chats'])
-            _data.setdefault('meta', {})['lastModified'] = int(time.time() * 1000)
-            mark_dirty()
-        print(f"Deleted user '{username}': removed_users={removed_users}, removed_chats={removed_chats}, removed_reqs={removed_reqs}")
+    with ShieldDisabled(actor='admin_tool') as shield, data_lock:
+        # remove user
+        removed_users = 0
+        u = _users_by_name.pop(username, None)
+        if u is not None:
+            _users_by_contact.pop(u.get('contactNumber'), None)
+            _data['users'].remove(u)
+            mark_dirty('del', ['users', u.get('id')])
+            removed_users = 1
+        # remove contact requests involving user
+        reqs = _contacts_by_user.pop(username, [])
+        for r in reqs:
+            _unindex_request(r)
+            mark_dirty('del', ['contactRequests', r.get('id')])
+        _remove_items(_data['contactRequests'], reqs)
+        removed_reqs = len(reqs)
+        # remove chats where user participates
+        chats = _chats_by_user.pop(username, [])
+        for c in chats:
+            _unindex_chat(c)
+            mark_dirty('del', ['chats', c.get('id')])
+        _remove_items(_data['chats'], chats)
+        removed_chats = len(chats)
+        shield.stage()
+    print(f"Deleted user '{username}': removed_users={removed_users}, removed_chats={removed_chats}, removed_reqs={removed_reqs}")
+
+@functools.lru_cache(maxsize=4096)
+def _fmt_iso(ms):
+    # chats are listed repeatedly with the same updatedAt values
+    return datetime.utcfromtimestamp(ms / 1000).isoformat()
 
 def list_chats():
+    lines = []
     with data_lock:
-        for c in _data.get('chats', []):
+        for c in _data['chats']:
             cid = c.get('id')
             typ = c.get('type')
             parts = ','.join(c.get('participants', []))
             lm = '-'
             if c.get('updatedAt'):
                 try:
-                    lm = datetime.utcfromtimestamp(c.get('updatedAt')/1000).isoformat()
+                    lm = _fmt_iso(c.get('updatedAt'))
                 except Exception:
                     lm = str(c.get('updatedAt'))
-            print(f"- {cid} [{typ}] participants=({parts}) updatedAt={lm}")
+            lines.append(f"- {cid} [{typ}] participants=({parts}) updatedAt={lm}")
+    _write_lines(lines)
 
 def delete_chat(chat_id):
     with data_lock:
-        chat = next((c for c in _data.get('chats', []) if c.get('id') == chat_id), None)
+        chat = _chat_by_id.get(chat_id)
     if not chat:
         print("Chat not found.")
         return
@@ -202,17 +643,19 @@ def delete_chat(chat_id):
         print("Aborted.")
         return
     backup_data(note=f"Deleting chat {chat_id}")
-    with ShieldDisabled(actor='admin_tool'):
-        with data_lock:
-            before_chats = len(_data.get('chats', []))
-            _data['chats'] = [c for c in _data.get('chats', []) if c.get('id') != chat_id]
-            removed = before_chats - len(_data['chats'])
-            _data.setdefault('meta', {})['lastModified'] = int(time.time() * 1000)
-            mark_dirty()
-        print(f"Deleted chat '{chat_id}'. removed={removed}")
+    with ShieldDisabled(actor='admin_tool') as shield, data_lock:
+        removed = 0
+        chat = _chat_by_id.get(chat_id)
+        if chat is not None:
+            _unindex_chat(chat)
+            _data['chats'].remove(chat)
+            mark_dirty('del', ['chats', chat_id])
+            removed = 1
+        shield.stage()
+    print(f"Deleted chat '{chat_id}'. removed={removed}")
 
 def change_username(old, new):
-    if not re.match(r'^[A-Za-z0-9_\-\.]{1,64}$', new):
+    if not _valid_username(new):
         print("New username contains invalid characters or length.")
         return
     if find_user(new):
@@ -227,38 +670,43 @@ def change_username(old, new):
         print("Aborted.")
         return
     backup_data(note=f"Renaming {old} -> {new}")
-    with ShieldDisabled(actor='admin_tool'):
-        with data_lock:
-            # update user
-            u['username'] = new
-            # update chats participants and inbox ids
-            for c in _data.get('chats', []):
-                parts = c.get('participants', [])
-                updated = False
-                for i, p in enumerate(parts):
-                    if p == old:
-                        parts[i] = new
-                        updated = True
-                if updated:
-                    if c.get('type') == 'inbox' and c.get('id') == f"inbox-{old}":
-                        c['id'] = f"inbox-{new}"
-            # update messages senders
-            for c in _data.get('chats', []):
-                for m in c.get('messages', []):
-                    if m.get('sender') == old:
-                        m['sender'] = new
-            # update contact requests
-            for r in _data.get('contactRequests', []):
-                if r.get('from') == old:
-                    r['from'] = new
-                if r.get('to') == old:
-                    r['to'] = new
-            _data.setdefault('meta', {})['lastModified'] = int(time.time() * 1000)
-            mark_dirty()
-        print(f"Renamed '{old}' to '{new}'.")
+    with ShieldDisabled(actor='admin_tool') as shield, data_lock:
+        # update user
+        u['username'] = new
+        _users_by_name[new] = _users_by_name.pop(old)
+        mark_dirty('set', ['users', u.get('id'), 'username'], new)
+        user_chats = _chats_by_user.pop(old, [])
+        _chats_by_user[new] = user_chats
+        # update participants, inbox id and message senders in one pass per chat
+        old_inbox = f"inbox-{old}"
+        for c in user_chats:
+            parts = c['participants']
+            parts[:] = [new if p == old else p for p in parts]
+            mark_dirty('set', ['chats', c.get('id'), 'participants'], parts)
+            if c.get('type') == 'inbox' and c.get('id') == old_inbox:
+                c['id'] = f"inbox-{new}"
+                _chat_by_id[c['id']] = _chat_by_id.pop(old_inbox)
+                mark_dirty('set', ['chats', old_inbox, 'id'], c['id'])
+            cid = c.get('id')
+            for m in c.get('messages', []):
+                if m.get('sender') == old:
+                    m['sender'] = new
+                    mark_dirty('set', ['chats', cid, 'messages', m.get('id'), 'sender'], new)
+        # update contact requests
+        user_reqs = _contacts_by_user.pop(old, [])
+        _contacts_by_user[new] = user_reqs
+        for r in user_reqs:
+            if r.get('from') == old:
+                r['from'] = new
+                mark_dirty('set', ['contactRequests', r.get('id'), 'from'], new)
+            if r.get('to') == old:
+                r['to'] = new
+                mark_dirty('set', ['contactRequests', r.get('id'), 'to'], new)
+        shield.stage()
+    print(f"Renamed '{old}' to '{new}'.")
 
 def change_contact_number(username, new_contact):
-    if not re.match(r'^C-\d{6}$', new_contact):
+    if not _valid_contact(new_contact):
         print("Contact number must be in format C-123456")
         return
     u = find_user(username)
@@ -266,21 +714,22 @@ def change_contact_number(username, new_contact):
         print("User not found.")
         return
     with data_lock:
-        for other in _data.get('users', []):
-            if other is not u and other.get('contactNumber') == new_contact:
-                print("Contact number already in use.")
-                return
+        other = _users_by_contact.get(new_contact)
+        if other is not None and other is not u:
+            print("Contact number already in use.")
+            return
     confirm = input(f"Change contact number for '{username}' -> '{new_contact}' ? (yes/NO): ").strip().lower()
     if confirm != 'yes':
         print("Aborted.")
         return
     backup_data(note=f"Changing contact number for {username} -> {new_contact}")
-    with ShieldDisabled(actor='admin_tool'):
-        with data_lock:
-            u['contactNumber'] = new_contact
-            _data.setdefault('meta', {})['lastModified'] = int(time.time() * 1000)
-            mark_dirty()
-        print(f"Updated contact for '{username}' to '{new_contact}'.")
+    with ShieldDisabled(actor='admin_tool') as shield, data_lock:
+        _users_by_contact.pop(u.get('contactNumber'), None)
+        u['contactNumber'] = new_contact
+        _users_by_contact[new_contact] = u
+        mark_dirty('set', ['users', u.get('id'), 'contactNumber'], new_contact)
+        shield.stage()
+    print(f"Updated contact for '{username}' to '{new_contact}'.")
 
 def show_menu():
     print("\nAdmin Menu")
@@ -329,13 +778,12 @@ def main_loop():
                 backup_data(note='manual backup')
             elif choice == '9':
                 print("Forcing save...")
-                with data_lock:
-                    save_data(force=True)
+                save_data(force=True)
             elif choice == '0':
                 print("Exiting. Final save...")
                 _stop_event.set()
-                with data_lock:
-                    save_data(force=True)
+                save_data(force=True)
+                close_journal()
                 break
             else:
                 print("Unknown option.")
@@ -343,8 +791,8 @@ def main_loop():
     except (KeyboardInterrupt, EOFError):
         print("\nInterrupted. Saving and exiting...")
         _stop_event.set()
-        with data_lock:
-            save_data(force=True)
+        save_data(force=True)
+        close_journal()
 
 if __name__ == '__main__':
     main_loop()
\ No newline at end of file
@@ -1,26 +1,96 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
+import httpx
+import importlib.util
+import os
 import sys
 import json
 
-client = OpenAI(
+# Only the newest MAX_TURNS non-system messages are sent, so prompt size stays bounded
+MAX_TURNS = int(os.environ.get('AI_MAX_TURNS', '16'))
+
+# One client for the life of the process. Concurrent requests share its
+# keep-alive pool, multiplexed over one HTTP/2 connection when h2 is installed.
+client = AsyncOpenAI(
     api_key="no api key to see :3",
     base_url="https://api.sambanova.ai/v1",
+    timeout=httpx.Timeout(60.0, connect=10.0),
+    http_client=httpx.AsyncClient(
+        http2=importlib.util.find_spec('h2') is not None,
+        limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=300.0),
+    ),
 )
 
-def get_ai_response(messages):
-    response = client.chat.completions.create(
+def trim_history(messages):
+    # keep the first system prompt plus the most recent turns
+    system = [m for m in messages if m.get('role') == 'system'][:1]
+    rest = [m for m in messages if m.get('role') != 'system']
+    return system + rest[-MAX_TURNS:] if MAX_TURNS > 0 else system + rest
+
+async def stream_ai_response(messages):
+    response = await client.chat.completions.create(
         model="Qwen3-32B",
-        messages=messages,
+        messages=trim_history(messages),
         temperature=0.1,
-        top_p=0.1
+        top_p=0.1,
+        stream=True
     )
-    return response.choices[0].message.content
+    async for chunk in response:
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ''
 
-if __name__ == "__main__":
-    # Accept messages as JSON from stdin
+async def get_ai_response(messages):
+    return ''.join([text async for text in stream_ai_response(messages)])
+
+async def answer_plain(messages):
+    # the form index.js sends: a bare message list, reply text streamed as it arrives
     try:
-        messages = json.loads(sys.stdin.read())
-        output = get_ai_response(messages)
-        print(output)
+        async for text in stream_ai_response(messages):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        sys.stdout.write("\n")
     except Exception as e:
         print(f"Error: {e}")
+    sys.stdout.flush()
+
+async def answer_tagged(req):
+    # {"id": ..., "messages": [...]} -> one JSON line once the reply is complete
+    try:
+        reply = {"id": req.get('id'), "response": await get_ai_response(req['messages'])}
+    except Exception as e:
+        reply = {"id": req.get('id'), "error": str(e)}
+    sys.stdout.write(json.dumps(reply, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+async def main():
+    # Tagged requests run concurrently and may finish in any order; bare lists
+    # are answered one at a time. Don't mix the two forms in one process.
+    pending = set()
+    try:
+        while True:
+            line = await asyncio.to_thread(sys.stdin.readline)
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                req = json.loads(line)
+            except ValueError as e:
+                # no request id to answer to; keep the output one JSON object per line
+                sys.stdout.write(json.dumps({"id": None, "error": str(e)}) + "\n")
+                sys.stdout.flush()
+                continue
+            if isinstance(req, dict):
+                task = asyncio.create_task(answer_tagged(req))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            else:
+                await answer_plain(req)
+        if pending:
+            await asyncio.gather(*pending)
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    # Accept newline-delimited JSON requests from stdin
+    asyncio.run(main())